@@ -1,29 +1,38 @@
 from __future__ import annotations
 
-import base64
+import concurrent.futures
+import copy
 import datetime
 import io
+import itertools
 import json
+import os
 import pathlib
+import secrets
+import shutil
 import sqlite3
+import tempfile
 import uuid
 import warnings
 import zipfile
 from os import PathLike
-from typing import IO, List, Optional, Union
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
 
-from sqlmodel import MetaData, Session, create_engine
+from sqlalchemy import Table, func
+from sqlmodel import MetaData, Session, create_engine, select
 
 from actual.api import ActualServer
-from actual.api.models import BankSyncErrorDTO, RemoteFileListDTO
-from actual.crypto import create_key_buffer, decrypt_from_meta, encrypt, make_salt
+from actual.api.models import BankSyncErrorDTO, BankSyncTransactionResponseDTO, RemoteFileListDTO
+from actual.crypto import create_key_buffer, decrypt_from_meta, encrypt_bytes, make_salt
 from actual.database import (
     Accounts,
+    Migrations,
     Transactions,
-    apply_change,
+    apply_bulk_changes,
     get_attribute_from_reflected_table_name,
     get_class_from_reflected_table_name,
     reflect_model,
+    set_sqlite_pragmas,
     strong_reference_session,
 )
 from actual.exceptions import (
@@ -33,18 +42,20 @@ from actual.exceptions import (
     InvalidZipFile,
     UnknownFileId,
 )
-from actual.migrations import js_migration_statements
+from actual.migrations import js_migration_statements, sql_migration_statements
 from actual.protobuf_models import HULC_Client, Message, SyncRequest
 from actual.queries import (
     create_transaction,
     get_account,
-    get_accounts,
+    get_latest_transaction_date,
     get_or_create_clock,
     get_or_create_payee,
     get_ruleset,
+    get_syncable_accounts,
     get_transactions,
     reconcile_transaction,
 )
+from actual.rules import RuleSet
 from actual.utils.storage import get_tmp_folder
 from actual.version import __version__  # noqa: F401
 
@@ -92,7 +103,10 @@ class Actual(ActualServer):
         self.engine = None
         self._session: Session | None = None
         self._client: HULC_Client | None = None
-        self._meta: MetaData | None = None  # stores the metadata loaded from remote
+        self._meta: MetaData | None = None  # stores the metadata loaded from remote, reflected on demand
+        self._meta_schema_version: int | None = None  # number of applied migrations when the model was reflected
+        self._metadata: dict | None = None  # stores the content of metadata.json, written back on flush
+        self._metadata_dirty = False
         # set the correct file
         if file:
             self.set_file(file)
@@ -110,6 +124,7 @@ class Actual(ActualServer):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self._flush_metadata()
         if self._session:
             self._session.close()
         self._in_context = False
@@ -146,26 +161,67 @@ class Actual(ActualServer):
     def run_migrations(self, migration_files: List[str]):
         """Runs the migration files, skipping the ones that have already been run. The files can be retrieved from
         .data_file_index() method. This first file is the base database, and the following files are migrations.
-        Migrations can also be .js files. In this case, we have to extract and execute queries from the standard JS."""
-        conn = sqlite3.connect(self._data_dir / "db.sqlite")
-        for file in migration_files:
-            if not file.startswith("migrations"):
-                continue  # in case db.sqlite file gets passed as one of the migrations files
-            file_id = file.split("_")[0].split("/")[1]
-            if conn.execute(f"SELECT id FROM __migrations__ WHERE id = '{file_id}';").fetchall():
-                continue  # skip migration as it was already ran
-            migration = self.data_file(file)  # retrieves file from actual server
-            sql_statements = migration.decode()
-            if file.endswith(".js"):
-                # there is one migration which is Javascript. All entries inside db.execQuery(`...`) must be executed
-                exec_entries = js_migration_statements(sql_statements)
-                sql_statements = "\n".join(exec_entries)
-            conn.executescript(sql_statements)
-            conn.execute(f"INSERT INTO __migrations__ (id) VALUES ({file_id});")
-        conn.commit()
-        conn.close()
-        # update the metadata by reflecting the model
-        self._meta = reflect_model(self.engine)
+        Migrations can also be .js files. In this case, we have to extract and execute queries from the standard JS.
+
+        All migrations are executed inside a single transaction, so that the changes are written to disk only once."""
+        # autocommit mode, since the transaction is controlled manually
+        conn = sqlite3.connect(self._data_dir / "db.sqlite", isolation_level=None)
+        conn.executescript("PRAGMA synchronous=NORMAL; PRAGMA temp_store=MEMORY; PRAGMA cache_size=-65536;")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            already_applied = {row[0] for row in conn.execute("SELECT id FROM __migrations__;")}
+            applied_migrations = []
+            for file in migration_files:
+                if not file.startswith("migrations"):
+                    continue  # in case db.sqlite file gets passed as one of the migrations files
+                file_id = int(file.split("_")[0].split("/")[1])
+                if file_id in already_applied:
+                    continue  # skip migration as it was already ran
+                migration = self.data_file(file)  # retrieves file from actual server
+                sql_statements = migration.decode()
+                if file.endswith(".js"):
+                    # there is one migration which is Javascript. All entries inside db.execQuery(`...`) must run
+                    sql_statements = "\n".join(js_migration_statements(sql_statements))
+                # executescript would commit the open transaction, so execute the statements one by one instead
+                for statement in sql_migration_statements(sql_statements):
+                    conn.execute(statement)
+                applied_migrations.append((file_id,))
+            conn.executemany("INSERT INTO __migrations__ (id) VALUES (?);", applied_migrations)
+            conn.execute("COMMIT")
+        except BaseException:
+            # SQLite already rolls back the transaction itself on some errors, i.e. when the disk is full
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        # the model only needs to be reflected again if the schema changed
+        if self._meta_schema_version != len(already_applied) + len(applied_migrations):
+            self.invalidate_meta()
+
+    def invalidate_meta(self):
+        """Drops the reflected database model, so that it is reflected again the next time it is needed. Should be
+        called whenever the database schema changes."""
+        self._meta, self._meta_schema_version = None, None
+
+    def _schema_version(self) -> int:
+        """Returns the number of migrations applied to the database, used to detect changes to the schema."""
+        with Session(self.engine) as session:
+            return session.exec(select(func.count()).select_from(Migrations)).one()
+
+    def _reflected_meta(self) -> MetaData:
+        """Returns the reflected database model, reflecting it from the engine if it was not loaded yet."""
+        if self._meta is None:
+            self._meta = reflect_model(self.engine)
+            self._meta_schema_version = self._schema_version()
+        return self._meta
+
+    def _meta_is_stale(self) -> bool:
+        """Checks if migrations were applied since the model was reflected, invalidating it if that is the case."""
+        if self._meta_schema_version == self._schema_version():
+            return False
+        self.invalidate_meta()
+        return True
 
     def create_budget(self, budget_name: str):
         """Creates a budget using the remote server default database and migrations. If password is provided, the
@@ -181,8 +237,12 @@ class Actual(ActualServer):
         # first migration file is the default database
         migration = self.data_file(migration_files[0])
         (self._data_dir / "db.sqlite").write_bytes(migration)
+        # enable incremental vacuum, so that compacting the database does not need to rewrite the whole file
+        conn = sqlite3.connect(self._data_dir / "db.sqlite", isolation_level=None)
+        conn.executescript("PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+        conn.close()
         # also write the metadata file with default fields
-        random_id = str(uuid.uuid4()).replace("-", "")[:7]
+        random_id = secrets.token_hex(4)[:7]
         self.update_metadata(
             {
                 "id": f"My-Finances-{random_id}",
@@ -194,7 +254,8 @@ class Actual(ActualServer):
         )
         self._file = RemoteFileListDTO(name=budget_name, fileId=file_id, groupId=None, deleted=0, encryptKeyId=None)
         # generate a session
-        self.engine = create_engine(f"sqlite:///{self._data_dir}/db.sqlite")
+        self.engine = self._create_sqlite_engine()
+        self.invalidate_meta()
         # create engine for downloaded database and run migrations
         self.run_migrations(migration_files[1:])
         if self._in_context:
@@ -204,6 +265,7 @@ class Actual(ActualServer):
             self._client = HULC_Client()
             get_or_create_clock(session, self._client)
             session.commit()
+        self._flush_metadata()
 
     def rename_budget(self, budget_name: str):
         """Renames the budget with the given name."""
@@ -221,12 +283,17 @@ class Actual(ActualServer):
 
     def cleanup(self):
         """
-        Cleans up the database from all deleted transactions, message caches and runs a VACUUM. Should reduce the size
-        of the database before exporting it.
+        Cleans up the database from all deleted transactions, message caches and compacts the database. Should reduce
+        the size of the database before exporting it.
 
         Taken from source code at
         [actual/packages/loot-core/src/server/sync/reset.ts](https://github.com/actualbudget/actual/blob/89006275a092d2309ab03162a047e07663789198/packages/loot-core/src/server/sync/reset.ts#L37-L47)
         """
+        self.cleanup_tombstones()
+        self.compact()
+
+    def cleanup_tombstones(self):
+        """Deletes all deleted entries and message caches from the database, without compacting the database file."""
         with sqlite3.connect(self._data_dir / "db.sqlite") as conn:
             conn.executescript(
                 """
@@ -239,26 +306,60 @@ class Actual(ActualServer):
                 DELETE FROM category_groups WHERE tombstone = 1;
                 DELETE FROM schedules WHERE tombstone = 1;
                 DELETE FROM rules WHERE tombstone = 1;
-                ANALYZE;
-                VACUUM;
             """
             )
 
-    def export_data(self, output_file: str | PathLike[str] | IO[bytes] = None, cleanup: bool = True) -> bytes:
+    def compact(self):
+        """Analyzes the database and reclaims the unused space from the database file. If the database was created with
+        incremental auto vacuum, only the free pages are released, otherwise a full VACUUM rewrites the whole file."""
+        conn = sqlite3.connect(self._data_dir / "db.sqlite", isolation_level=None)
+        try:
+            conn.execute("ANALYZE;")
+            # 2 means incremental, see https://www.sqlite.org/pragma.html#pragma_auto_vacuum
+            if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] == 2:
+                conn.executescript("PRAGMA incremental_vacuum;")  # execute() would only release a single page
+            else:
+                conn.execute("VACUUM;")
+        finally:
+            conn.close()
+
+    def _write_zip(self, output_file: str | PathLike[str] | IO[bytes]):
+        """Writes the db.sqlite and metadata.json files as a zip file to `output_file`. The lowest compression level is
+        used, since the database compresses well even with it, and higher levels take much longer for large files."""
+        self._flush_metadata()
+        with zipfile.ZipFile(output_file, "w", zipfile.ZIP_DEFLATED, False, compresslevel=1) as z:
+            z.write(self._data_dir / "db.sqlite", "db.sqlite")
+            z.write(self._data_dir / "metadata.json", "metadata.json")
+
+    def _build_zip_bytes(self) -> bytes:
+        """Builds the zip file with db.sqlite and metadata.json in memory and returns its content."""
+        temp_file = io.BytesIO()
+        self._write_zip(temp_file)
+        return temp_file.getvalue()
+
+    def export_data(
+        self, output_file: str | PathLike[str] | IO[bytes] = None, cleanup: bool = True, compact: bool = False
+    ) -> Optional[bytes]:
         """Export your data as a zip file containing db.sqlite and metadata.json files. It can be imported into another
         Actual instance by closing an open file (if any), then clicking the “Import file” button, then choosing
-        “Actual.” Even when encryption is enabled, the exported zip file will not have any encryption."""
+        “Actual.” Even when encryption is enabled, the exported zip file will not have any encryption.
+
+        If `output_file` is provided, the zip file is written directly to it and nothing is returned. Otherwise, the
+        content of the zip file is returned as bytes.
+
+        :param output_file: path or file object where the zip file should be written to.
+        :param cleanup: if the deleted entries and message caches should be removed before exporting.
+        :param compact: if the database file should also be compacted before exporting. This rewrites the database
+                        file, so it is disabled by default.
+        """
         if cleanup:
-            self.cleanup()
-        temp_file = io.BytesIO()
-        with zipfile.ZipFile(temp_file, "a", zipfile.ZIP_DEFLATED, False) as z:
-            z.write(self._data_dir / "db.sqlite", "db.sqlite")
-            z.write(self._data_dir / "metadata.json", "metadata.json")
-        content = temp_file.getvalue()
+            self.cleanup_tombstones()
+        if compact:
+            self.compact()
         if output_file:
-            with open(output_file, "wb") as f:
-                f.write(content)
-        return content
+            self._write_zip(output_file)
+            return None
+        return self._build_zip_bytes()
 
     def encrypt(self, encryption_password: str):
         """Encrypts the local database using a new key, and re-uploads to the server.
@@ -273,18 +374,16 @@ class Actual(ActualServer):
             self.user_create_key(self._file.file_id, key_id, encryption_password, salt)
             self.update_metadata({"encryptKeyId": key_id})
             self._file.encrypt_key_id = key_id
-        elif self._file.encrypt_key_id:
+        elif self._file.encrypt_key_id and encryption_password is not None:
             key_info = self.user_get_key(self._file.file_id)
             salt = key_info.data.salt
         else:
             raise ActualError("Budget is encrypted but password was not provided")
         self._master_key = create_key_buffer(encryption_password, salt)
         # encrypt binary data with
-        encrypted = encrypt(self._file.encrypt_key_id, self._master_key, self.export_data())
-        binary_data = io.BytesIO(base64.b64decode(encrypted["value"]))
-        encryption_meta = encrypted["meta"]
+        binary_data, encryption_meta = encrypt_bytes(self._file.encrypt_key_id, self._master_key, self.export_data())
         self.reset_user_file(self._file.file_id)
-        self.upload_user_file(binary_data.getvalue(), self._file.file_id, self._file.name, encryption_meta)
+        self.upload_user_file(binary_data, self._file.file_id, self._file.name, encryption_meta)
         self.set_file(self._file.file_id)
 
     def upload_budget(self):
@@ -298,12 +397,8 @@ class Actual(ActualServer):
             metadata = self.get_metadata()
             budget_name = metadata.get("budgetName", "My Finances")
             self._file = RemoteFileListDTO(name=budget_name, fileId=file_id, groupId=None, deleted=0, encryptKeyId=None)
-        binary_data = io.BytesIO()
-        with zipfile.ZipFile(binary_data, "a", zipfile.ZIP_DEFLATED, False) as z:
-            z.write(self._data_dir / "db.sqlite", "db.sqlite")
-            z.write(self._data_dir / "metadata.json", "metadata.json")
         # we have to first upload the user file so the reference id can be used to generate a new encryption key
-        self.upload_user_file(binary_data.getvalue(), self._file.file_id, self._file.name)
+        self.upload_user_file(self._build_zip_bytes(), self._file.file_id, self._file.name)
         # reset local file id to retrieve the grouping id
         self.set_file(self._file.file_id)
         # encrypt the file and re-upload
@@ -322,53 +417,87 @@ class Actual(ActualServer):
         """Applies a list of sync changes, based on what the sync method returned on the remote."""
         if not self.engine:
             raise UnknownFileId("No valid file available, download one with download_budget()")
-        with Session(self.engine) as s:
-            # use the current value to group updates together to the same row
-            current_table, current_id, current_value = None, None, {}
-            for message in messages:
-                if message.dataset == "prefs":
-                    # write it to metadata.json instead
-                    self.update_metadata({message.row: message.get_value()})
-                    continue
-                table = get_class_from_reflected_table_name(self._meta, message.dataset)
+        with Session(self.engine) as s, s.begin():
+            self._apply_changes(s, messages)
+        # changes to the preferences are written to metadata.json right away
+        self._flush_metadata()
+
+    def _apply_changes(self, s: Session, messages: List[Message]):
+        """Applies the list of sync changes using the provided session, without committing."""
+        # group updates together to the same row, so that each row is only written once
+        rows: Dict[Tuple[str, str], Dict[str, Union[str, int, float, None]]] = {}
+        # cache the reflected tables and columns, since the same ones are looked up for every message
+        resolved: Dict[str, Tuple[Table, Dict[str, str]]] = {}
+        for message in messages:
+            # read the fields from the underlying protobuf, as the attribute access on the wrapper is expensive
+            pb = Message.pb(message)
+            dataset, row, column_name, value = pb.dataset, pb.row, pb.column, Message.decode_value(pb.value)
+            if dataset == "prefs":
+                # write it to metadata.json instead
+                self.update_metadata({row: value})
+                continue
+            if dataset not in resolved:
+                table = get_class_from_reflected_table_name(self._reflected_meta(), dataset)
+                if table is None and self._meta_is_stale():
+                    table = get_class_from_reflected_table_name(self._reflected_meta(), dataset)
                 if table is None:
                     raise ActualError(
-                        f"Actual found a table not supported by the library: table '{message.dataset}' not found\n"
+                        f"Actual found a table not supported by the library: table '{dataset}' not found\n"
                     )
-                column = get_attribute_from_reflected_table_name(self._meta, message.dataset, message.column)
+                resolved[dataset] = (table, {})
+            table, columns = resolved[dataset]
+            if column_name not in columns:
+                column = get_attribute_from_reflected_table_name(self._reflected_meta(), dataset, column_name)
                 if column is None:
                     raise ActualError(
                         f"Actual found a column not supported by the library: "
-                        f"column '{message.column}' at table '{message.dataset}' not found\n"
+                        f"column '{column_name}' at table '{dataset}' not found\n"
                     )
-                # if the current id exists, and it's different from the next one, we update the values
-                next_id = message.row
-                if current_id and (current_id != next_id or table != current_table):
-                    apply_change(s, current_table, current_id, current_value)
-                    current_table, current_id, current_value = table, next_id, {column: message.get_value()}
-                # otherwise update the cache with the current value
-                else:
-                    current_table, current_id, current_value[column] = table, next_id, message.get_value()
-            # if after finishing all values there is a value left, update it too
-            if current_table is not None and current_id is not None and current_value is not None:
-                apply_change(s, current_table, current_id, current_value)
-            s.commit()
+                columns[column_name] = column.name
+            # later messages override the previous values of the same row
+            rows.setdefault((dataset, row), {"id": row})[columns[column_name]] = value
+        # bucket the rows that change the same set of columns, so that each bucket is written with one statement
+        buckets: Dict[Tuple[str, Tuple[str, ...]], List[dict]] = {}
+        for (dataset, _), values in rows.items():
+            buckets.setdefault((dataset, tuple(sorted(values.keys()))), []).append(values)
+        for (dataset, _), changes in buckets.items():
+            apply_bulk_changes(s, resolved[dataset][0], changes)
 
     def get_metadata(self) -> dict:
-        """Gets the content of metadata.json."""
-        metadata_file = self._data_dir / "metadata.json"
-        return json.loads(metadata_file.read_text())
+        """Gets the content of metadata.json. The file is only read once, and further changes are kept in memory until
+        they are flushed. A copy is returned, use `update_metadata` to change the content."""
+        return copy.deepcopy(self._cached_metadata())
+
+    def _cached_metadata(self) -> dict:
+        """Returns the cached content of metadata.json, reading the file if it was not loaded yet."""
+        if self._metadata is None:
+            metadata_file = self._data_dir / "metadata.json"
+            self._metadata = json.loads(metadata_file.read_text())
+        return self._metadata
 
     def update_metadata(self, patch: dict):
         """Updates the metadata.json from the Actual file with the patch fields. The patch is a dictionary that will
-        then be merged on the metadata and written again to a file."""
+        then be merged on the metadata. The file is written on the next flush, that happens after syncing, committing,
+        exporting or uploading the budget and when leaving the context manager."""
+        if self._metadata is None and not (self._data_dir / "metadata.json").is_file():
+            self._metadata = {}
+        self._cached_metadata().update(patch)
+        self._metadata_dirty = True
+
+    def _flush_metadata(self):
+        """Writes the pending metadata changes to metadata.json, if there are any."""
+        if not self._metadata_dirty:
+            return
         metadata_file = self._data_dir / "metadata.json"
-        if metadata_file.is_file():
-            config = self.get_metadata()
-            config.update(patch)
-        else:
-            config = patch
-        metadata_file.write_text(json.dumps(config, separators=(",", ":")))
+        metadata_file.write_text(json.dumps(self._metadata, separators=(",", ":")))
+        self._metadata_dirty = False
+
+    def _data_dir_files(self) -> set[str]:
+        """Returns the names of the files stored in the data directory, listed with a single directory scan."""
+        if not self._data_dir.is_dir():
+            return set()
+        with os.scandir(self._data_dir) as entries:
+            return {entry.name for entry in entries if entry.is_file()}
 
     def download_budget(self, encryption_password: str = None):
         """Downloads the budget file from the remote. After the file is downloaded, the sync endpoint is queries
@@ -386,13 +515,14 @@ class Actual(ActualServer):
         encryption_password = encryption_password or self._encryption_password
         self.download_master_encryption_key(encryption_password)
         # then download user file if the data_dir is set and both files are present
-        if self._data_dir and all((self._data_dir / path).is_file() for path in ["db.sqlite", "metadata.json"]):
+        if self._data_dir and {"db.sqlite", "metadata.json"} <= self._data_dir_files():
             group_id = self.get_metadata().get("groupId")
             # handle the case where a new group id exists and the file needs to be re-downloaded
             if self._file.group_id != group_id:
                 warnings.warn("Sync id has been reset on remote database, re-downloading the budget.")
                 (self._data_dir / "db.sqlite").unlink()
                 (self._data_dir / "metadata.json").unlink()
+                self._metadata, self._metadata_dirty = None, False
                 return self.download_budget(encryption_password)
             # resume budget
             self.create_engine()
@@ -402,7 +532,13 @@ class Actual(ActualServer):
                 file_info = self.get_user_file_info(self._file.file_id)
                 # decrypt file bytes
                 file_bytes = decrypt_from_meta(self._master_key, file_bytes, file_info.data.encrypt_meta)
-            self.import_zip(io.BytesIO(file_bytes))
+            # write the budget to a temporary file, so that the downloaded bytes can be released before extracting.
+            # SpooledTemporaryFile is not seekable before Python 3.11, which zipfile requires to read the members
+            with tempfile.TemporaryFile() as zip_file:
+                zip_file.write(file_bytes)
+                del file_bytes
+                zip_file.seek(0)
+                self.import_zip(zip_file)
             # sometimes downloaded budgets will not have the groupId
             self.update_metadata({"groupId": self._file.group_id})
         # actual js always calls validation
@@ -436,18 +572,32 @@ class Actual(ActualServer):
         # try to extract the file_id from the metadata.json
         if not self._data_dir:
             try:
-                metadata = zip_file.read("metadata.json")
-                file_id = json.loads(metadata).get("cloudFileId", None)
+                with zip_file.open("metadata.json") as metadata:
+                    file_id = json.load(metadata).get("cloudFileId", None)
             except (KeyError, ValueError):
                 file_id = None  # can happen if zip does not contain the file or file is not proper JSON
             self._data_dir = get_tmp_folder(file_id)
-        # this should extract 'db.sqlite' and 'metadata.json' to the folder
-        zip_file.extractall(self._data_dir)
+        # this should extract 'db.sqlite' and 'metadata.json' to the folder, one member at a time with a bounded buffer
+        data_dir = self._data_dir.resolve()
+        with zip_file:
+            for info in zip_file.infolist():
+                target = (data_dir / info.filename).resolve()
+                if info.is_dir() or not target.is_relative_to(data_dir):
+                    continue  # only regular files inside the data dir are extracted
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with zip_file.open(info) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst, length=1 << 20)
+        # the metadata.json was replaced by the imported one
+        self._metadata, self._metadata_dirty = None, False
         self.create_engine()
 
+    def _create_sqlite_engine(self):
+        """Creates the engine for the local database, waiting on locks instead of failing right away."""
+        return set_sqlite_pragmas(create_engine(f"sqlite:///{self._data_dir}/db.sqlite", connect_args={"timeout": 30}))
+
     def create_engine(self):
-        self.engine = create_engine(f"sqlite:///{self._data_dir}/db.sqlite")
-        self._meta = reflect_model(self.engine)
+        self.engine = self._create_sqlite_engine()
+        self.invalidate_meta()
         # load the client id
         with Session(self.engine) as session:
             clock = get_or_create_clock(session)
@@ -468,13 +618,18 @@ class Actual(ActualServer):
         )
         request.set_timestamp(client_id=self._client.client_id, now=self._client.ts)
         changes = self.sync_sync(request)
-        self.apply_changes(changes.get_messages(self._master_key))
-        # after receiving changes, update the client clock with the latest value
-        if changes.messages:
-            self._client = HULC_Client.from_timestamp(changes.messages[-1].timestamp)
-            # store timestamp also inside database. Session might not be available here, so we create one
-            with Session(self.engine) as session:
+        messages = changes.get_messages(self._master_key)
+        if not self.engine:
+            raise UnknownFileId("No valid file available, download one with download_budget()")
+        # the changes and the clock are written in the same transaction, using a separate session since the clock
+        # entry is not tracked
+        with Session(self.engine) as session, session.begin():
+            self._apply_changes(session, messages)
+            # after receiving changes, update the client clock with the latest value
+            if changes.messages:
+                self._client = HULC_Client.from_timestamp(changes.messages[-1].timestamp)
                 get_or_create_clock(session, self._client)
+        self._flush_metadata()
 
     def commit(self):
         """Adds all pending entries to the local database, and sends a sync request to the remote server to synchronize
@@ -495,26 +650,29 @@ class Actual(ActualServer):
             req.set_messages(self._session.info["messages"], self._client, master_key=self._master_key)
         # commit to local database to clear the current flush cache
         self._session.commit()
+        self._flush_metadata()
         # sync all changes to the server
         if self._file.group_id:  # only files with a group id can be synced
             self.sync_sync(req)
 
-    def run_rules(self, transactions: Optional[List[Transactions]] = None):
-        """Runs all the stored rules on the database on all transactions, without any filters."""
+    def run_rules(self, transactions: Optional[List[Transactions]] = None, ruleset: Optional[RuleSet] = None):
+        """Runs all the stored rules on the database on all transactions, without any filters.
+
+        If a `ruleset` is not provided, the stored rules are loaded from the database on every call, so that rules
+        changed in the session are always considered. When running the rules multiple times on an unchanged database,
+        load them once with `get_ruleset` and provide them instead."""
         if transactions is None:
             transactions = get_transactions(self.session, is_parent=True)
-        ruleset = get_ruleset(self.session)
+        if ruleset is None:
+            ruleset = get_ruleset(self.session)
         ruleset.run(transactions)
 
     def _run_bank_sync_account(
-        self, acct: Accounts, start_date: datetime.date, is_first_sync: bool
+        self,
+        acct: Accounts,
+        new_transactions_data: BankSyncTransactionResponseDTO | BankSyncErrorDTO,
+        is_first_sync: bool,
     ) -> List[Transactions]:
-        sync_method = acct.account_sync_source
-        account_id = acct.account_id
-        requisition_id = acct.bank.bank_id if sync_method == "goCardless" else None
-        new_transactions_data = self.bank_sync_transactions(
-            sync_method.lower(), account_id, start_date, requisition_id=requisition_id
-        )
         if isinstance(new_transactions_data, BankSyncErrorDTO):
             raise ActualBankSyncError(
                 new_transactions_data.data.error_type,
@@ -529,7 +687,7 @@ class Actual(ActualServer):
             balance_to_use = new_transactions_data.data.balance
             # For simpleFin, the startingBalance is actually the current balance, so we have to use it to deduce the
             # actual startingBalance
-            if acct.account_sync_source and acct.account_sync_source.lower() == "simplefin":
+            if acct.sync_method_key == "simplefin":
                 current_balance = new_transactions_data.data.balance
                 balance_to_use = current_balance - sum(t.transaction_amount.amount for t in new_transactions)
             if balance_to_use:
@@ -541,13 +699,16 @@ class Actual(ActualServer):
                 )
                 reconciled_transaction.starting_balance_flag = 1  # to tell is a starting balance
                 imported_transactions.append(reconciled_transaction)
+        # index the matched transactions by id, so that each reconciliation does not have to go through the list
+        already_matched = {t.id: t for t in imported_transactions}
+        session = self.session
         # Consume transactions in the ascending order
-        for transaction in new_transactions[::-1]:
+        for transaction in reversed(new_transactions):
             if not transaction.booked:
                 continue
             payee = transaction.payee_name or ""
             reconciled = reconcile_transaction(
-                self.session,
+                session,
                 transaction.date,
                 acct,
                 payee,
@@ -556,15 +717,25 @@ class Actual(ActualServer):
                 imported_id=transaction.transaction_id,
                 cleared=transaction.booked,
                 imported_payee=payee,
-                already_matched=imported_transactions,
+                already_matched=already_matched,
             )
             if reconciled.changed():
                 imported_transactions.append(reconciled)
+                already_matched[reconciled.id] = reconciled
         return imported_transactions
 
     def run_bank_sync(
         self, account: str | Accounts | None = None, start_date: datetime.date | None = None, run_rules: bool = False
     ) -> List[Transactions]:
+        """
+        Runs the bank synchronization for the selected account, returning all imported transactions. The arguments are
+        the same as [Actual.run_bank_sync_iter][actual.Actual.run_bank_sync_iter], which is documented in detail.
+        """
+        return list(itertools.chain.from_iterable(self.run_bank_sync_iter(account, start_date, run_rules)))
+
+    def run_bank_sync_iter(
+        self, account: str | Accounts | None = None, start_date: datetime.date | None = None, run_rules: bool = False
+    ) -> Iterator[List[Transactions]]:
         """
         Runs the bank synchronization for the selected account. If missing, all accounts are synchronized. If a
         start_date is provided, is used as a reference, otherwise, the last timestamp of each account will be used. If
@@ -577,34 +748,51 @@ class Actual(ActualServer):
         If `run_rules` is set, the rules will be run for the imported transactions. Please note that unlike Actual,
         the rules here are ran at the final imported objects. This is unlikely to cause data mismatches,
         but if you find any issues feel free to report this as an issue.
+
+        The imported transactions are yielded in batches, one per account, as soon as each account is reconciled, so
+        that the caller can process them while the remaining accounts are still being imported.
+
+        The imported transactions are only added to the session. They are written to the database, and sent to the
+        server, in a single transaction once [Actual.commit][actual.Actual.commit] is called.
         """
         # if no account is provided, sync all of them, otherwise just the account provided
         if account is None:
-            accounts = get_accounts(self.session)
+            accounts = get_syncable_accounts(self.session)
         else:
             account = get_account(self.session, account)
             accounts = [account]
-        imported_transactions = []
-
-        default_start_date: datetime.date = start_date
-        is_first_sync: bool = False
-        for acct in accounts:
-            sync_method = acct.account_sync_source
-            account_id = acct.account_id
-            if not (account_id and sync_method):
-                continue
-            status = self.bank_sync_status(sync_method.lower())
-            if not status.data.configured:
-                continue
-            if start_date is None:
-                all_transactions = get_transactions(self.session, account=acct)
-                if all_transactions:
-                    default_start_date = all_transactions[0].get_date()
-                else:
-                    is_first_sync = True
-                    default_start_date = datetime.date.today() - datetime.timedelta(days=90)
-            transactions = self._run_bank_sync_account(acct, default_start_date, is_first_sync)
-            imported_transactions.extend(transactions)
-        if run_rules:
-            self.run_rules(imported_transactions)
-        return imported_transactions
+        linked_accounts = [a for a in accounts if a.account_id and a.account_sync_source]
+        # check the status only once for each sync method, since it is shared by all accounts using it
+        sync_methods = dict.fromkeys(a.sync_method_key for a in linked_accounts)
+        status_cache = {method: self.bank_sync_status(method) for method in sync_methods}
+        eligible_accounts = [a for a in linked_accounts if status_cache[a.sync_method_key].data.configured]
+        # accounts without transactions use the same reference date, even if the sync runs across midnight
+        first_sync_start_date = datetime.date.today() - datetime.timedelta(days=90)
+        # the session is not thread-safe, so all database work happens here and only the requests are sent in parallel
+        pending_requests = []
+        for acct in eligible_accounts:
+            sync_method, account_id = acct.sync_method_key, acct.account_id
+            # the start date is computed for each account, based only on its own transactions
+            acct_start_date, acct_first_sync = start_date, False
+            if acct_start_date is None:
+                acct_start_date = get_latest_transaction_date(self.session, acct)
+                if acct_start_date is None:
+                    acct_first_sync = True
+                    acct_start_date = first_sync_start_date
+            requisition_id = acct.bank.bank_id if sync_method == "gocardless" else None
+            request_args = (sync_method, account_id, acct_start_date, requisition_id)
+            pending_requests.append((acct, request_args, acct_first_sync))
+        if not pending_requests:
+            return
+        # bound the requests in flight, since the bank sync providers rate limit and more workers barely help
+        # the rules are loaded only once for all the batches of the same sync
+        ruleset = get_ruleset(self.session) if run_rules else None
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(4, len(pending_requests))) as executor:
+            futures = [executor.submit(self.bank_sync_transactions, *args) for _, args, _ in pending_requests]
+            # reconcile in the same order as the accounts, so that the results do not depend on the response times
+            for (acct, _, acct_first_sync), future in zip(pending_requests, futures):
+                transactions = self._run_bank_sync_account(acct, future.result(), acct_first_sync)
+                # rules only depend on the transaction they run on, so they can be applied to each batch separately
+                if run_rules:
+                    self.run_rules(transactions, ruleset)
+                yield transactions
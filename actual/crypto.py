@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import base64
+import functools
 import os
+import typing
 import uuid
 
 import cryptography.exceptions
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
 from actual.exceptions import ActualDecryptionError
@@ -22,39 +25,75 @@ def make_salt(length: int = 32) -> str:
     return base64.b64encode(os.urandom(length)).decode()
 
 
+@functools.lru_cache(maxsize=8)
 def create_key_buffer(password: str, key_salt: str) -> bytes:
+    """Derives the master key from the password and salt. The derivation is slow by design, so the results are cached
+    for the combinations of password and salt that were already used."""
     kdf = PBKDF2HMAC(algorithm=hashes.SHA512(), length=32, salt=key_salt.encode(), iterations=10_000)
     return kdf.derive(password.encode())
 
 
-def encrypt(key_id: str, master_key: bytes, plaintext: bytes) -> dict:
-    iv = os.urandom(12)
-    encryptor = Cipher(algorithms.AES(master_key), modes.GCM(iv)).encryptor()
-    value = encryptor.update(plaintext) + encryptor.finalize()
-    auth_tag = encryptor.tag
+@functools.lru_cache(maxsize=8)
+def _aes_gcm(master_key: bytes) -> AESGCM:
+    """Returns the AES-GCM cipher for the master key. The cipher is cached since the same key is used for the whole
+    budget, including all the sync messages."""
+    return AESGCM(master_key)
+
+
+def _encryption_meta(key_id: str, iv: bytes, auth_tag: bytes) -> dict:
     return {
-        "value": base64.b64encode(value).decode(),
-        "meta": {
-            "keyId": key_id,
-            "algorithm": "aes-256-gcm",
-            "iv": base64.b64encode(iv).decode(),
-            "authTag": base64.b64encode(auth_tag).decode(),
-        },
+        "keyId": key_id,
+        "algorithm": "aes-256-gcm",
+        "iv": base64.b64encode(iv).decode(),
+        "authTag": base64.b64encode(auth_tag).decode(),
     }
 
 
+def encrypt_bytes(key_id: str, master_key: bytes, plaintext: bytes) -> typing.Tuple[bytes, dict]:
+    """Encrypts the plaintext, returning the raw ciphertext together with the encryption meta. Used when the ciphertext
+    is sent as binary, avoiding the base64 round trip of `encrypt`."""
+    iv = os.urandom(12)
+    # the streaming encryptor returns the authentication tag separately, so the ciphertext is returned as is instead
+    # of being sliced out of the one-shot output, which would copy it since the request body must be bytes
+    encryptor = Cipher(algorithms.AES(master_key), modes.GCM(iv)).encryptor()
+    value = encryptor.update(plaintext)
+    encryptor.finalize()  # GCM does not buffer, this only computes the tag
+    return value, _encryption_meta(key_id, iv, encryptor.tag)
+
+
+def encrypt(key_id: str, master_key: bytes, plaintext: bytes) -> dict:
+    iv = os.urandom(12)
+    # the one-shot API returns the authentication tag appended to the ciphertext, split it without copying, since the
+    # base64 encoding reads directly from the views
+    encrypted = memoryview(_aes_gcm(master_key).encrypt(iv, plaintext, None))
+    value, auth_tag = encrypted[:-16], encrypted[-16:]
+    return {"value": base64.b64encode(value).decode(), "meta": _encryption_meta(key_id, iv, auth_tag)}
+
+
 def decrypt(master_key: bytes, iv: bytes, ciphertext: bytes, auth_tag: bytes = None) -> bytes:
-    decryptor = Cipher(algorithms.AES(master_key), modes.GCM(iv, auth_tag)).decryptor()
+    """Decrypts the ciphertext with the cached one-shot cipher. A separate `auth_tag` is appended to the ciphertext,
+    which copies it, so this is meant for small payloads such as the sync messages. Large files should be decrypted
+    with `decrypt_from_meta` instead."""
+    if auth_tag is not None:
+        ciphertext = ciphertext + auth_tag
     try:
-        return decryptor.update(ciphertext) + decryptor.finalize()
+        return _aes_gcm(master_key).decrypt(iv, ciphertext, None)
     except cryptography.exceptions.InvalidTag:
         raise ActualDecryptionError("Error decrypting file. Is the encryption key correct?") from None
 
 
 def decrypt_from_meta(master_key: bytes, ciphertext: bytes, encrypt_meta) -> bytes:
+    """Decrypts a file, like the downloaded budget, using the encryption meta. The streaming decryptor receives the
+    tag separately, so the (possibly large) ciphertext is not copied to append it."""
     iv = base64.b64decode(encrypt_meta.iv)
     auth_tag = base64.b64decode(encrypt_meta.auth_tag)
-    return decrypt(master_key, iv, ciphertext, auth_tag)
+    decryptor = Cipher(algorithms.AES(master_key), modes.GCM(iv, auth_tag)).decryptor()
+    plaintext = decryptor.update(ciphertext)
+    try:
+        decryptor.finalize()  # verifies the tag, GCM does not buffer any data
+    except cryptography.exceptions.InvalidTag:
+        raise ActualDecryptionError("Error decrypting file. Is the encryption key correct?") from None
+    return plaintext
 
 
 def make_test_message(key_id: str, key: bytes) -> dict:
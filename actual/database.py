@@ -71,6 +71,22 @@ def reflect_model(eng: engine.Engine) -> MetaData:
     return local_meta
 
 
+def set_sqlite_pragmas(eng: engine.Engine) -> engine.Engine:
+    """Tunes every new connection of the engine for bulk writes: fewer fsync calls, temporary tables kept in memory
+    and a larger page cache. The journal mode is kept, since the `db.sqlite` file is zipped and uploaded as is."""
+
+    @event.listens_for(eng, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
+    return eng
+
+
 def get_class_from_reflected_table_name(metadata: MetaData, table_name: str) -> Union[Table, None]:
     """
     Returns, based on the defined tables on the reflected model the corresponding SQLAlchemy table.
@@ -126,6 +142,16 @@ def apply_change(
     session.exec(insert_stmt)  # noqa: Insert type here is correct
 
 
+def apply_bulk_changes(session: Session, table: Table, changes: List[Dict[str, Union[str, int, float, None]]]) -> None:
+    """This function upserts multiple rows into a table with a single statement. All `changes` must contain the `id`
+    as primary key and the same set of columns, so that the statement is compiled once and executed for all rows
+    at once. Rows will be inserted, and if the id already exists, the values will be updated."""
+    insert_stmt = insert(table)
+    columns = {column: insert_stmt.excluded[column] for column in changes[0].keys() if column != "id"}
+    insert_stmt = insert_stmt.on_conflict_do_update(index_elements=["id"], set_=columns)
+    session.exec(insert_stmt, params=changes)  # noqa: Insert type here is correct
+
+
 def strong_reference_session(session: Session):
     @event.listens_for(session, "before_flush")
     def before_flush(sess, flush_context, instances):
@@ -267,6 +293,12 @@ class Accounts(BaseModel, table=True):
         )
         return cents_to_decimal(value)
 
+    @property
+    def sync_method_key(self) -> str:
+        """Returns the normalized bank sync method of the account, i.e. `gocardless` or `simplefin`, as used by the bank
+        sync endpoints. If the account is not linked, returns an empty string."""
+        return (self.account_sync_source or "").lower()
+
     @property
     def notes(self) -> Optional[str]:
         """Returns notes for the account. If none are present, returns `None`."""
@@ -1,4 +1,5 @@
 import re
+import sqlite3
 import uuid
 import warnings
 from typing import List
@@ -49,3 +50,20 @@ def js_migration_statements(js_file: str) -> List[str]:
             query = query + ";"
         queries.append(query)
     return queries
+
+
+def sql_migration_statements(sql_file: str) -> List[str]:
+    """Splits a SQL migration file into its individual statements, so that they can be executed one by one inside
+    an already open transaction. The transaction control statements (`BEGIN`, `COMMIT` and `END`) from the file are
+    dropped, since the caller is responsible for the transaction handling."""
+    queries, buffer = [], ""
+    for part in sql_file.split(";"):
+        buffer += part + ";"
+        # triggers contain semicolons inside the body, so accumulate until the statement is complete
+        if not sqlite3.complete_statement(buffer):
+            continue
+        query, buffer = buffer.strip(), ""
+        if query == ";" or re.match(r"^(\s*--[^\n]*\n)*\s*(BEGIN|COMMIT|END)\b", query, re.IGNORECASE):
+            continue
+        queries.append(query)
+    return queries
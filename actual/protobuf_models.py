@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import base64
 import datetime
-import uuid
+import secrets
 from typing import List
 
 import proto
@@ -59,7 +59,7 @@ class HULC_Client:
         """Creates a client id for the HULC request. Implementation copied [from the source code](
         https://github.com/actualbudget/actual/blob/a9362cc6f9b974140a760ad05816cac51c849769/packages/crdt/src/crdt/timestamp.ts#L80)
         """
-        return str(uuid.uuid4()).replace("-", "")[-16:]
+        return secrets.token_hex(8)
 
 
 class EncryptedData(proto.Message):
@@ -78,7 +78,13 @@ class Message(proto.Message):
         """Serialization types from Actual. [Original source code](
         https://github.com/actualbudget/actual/blob/998efb9447da6f8ce97956cbe83d6e8a3c18cf53/packages/loot-core/src/server/sync/index.ts#L154-L160)
         """
-        datatype, _, value = self.value.partition(":")
+        return self.decode_value(self.value)
+
+    @staticmethod
+    def decode_value(serialized: str) -> str | int | float | None:
+        """Decodes a serialized value in the format `datatype:value`, as explained in `get_value`. Can be used directly
+        on the raw protobuf field, avoiding the overhead of the wrapper when decoding many messages."""
+        datatype, _, value = serialized.partition(":")
         if datatype == "S":
             return value
         elif datatype == "N":
@@ -33,7 +33,14 @@ from actual.database import (
 from actual.exceptions import ActualError
 from actual.protobuf_models import HULC_Client
 from actual.rules import Action, Condition, Rule, RuleSet
-from actual.utils.conversions import cents_to_decimal, current_timestamp, date_to_int, decimal_to_cents, month_range
+from actual.utils.conversions import (
+    cents_to_decimal,
+    current_timestamp,
+    date_to_int,
+    decimal_to_cents,
+    int_to_date,
+    month_range,
+)
 from actual.utils.title import title
 
 T = typing.TypeVar("T")
@@ -156,6 +163,28 @@ def get_transactions(
     return s.exec(query).all()
 
 
+def get_latest_transaction_date(s: Session, account: Accounts | str) -> typing.Optional[datetime.date]:
+    """
+    Returns the date of the most recent transaction of the account, or `None` if the account has no transactions.
+    This is the same as the date of the first entry returned by `get_transactions`, but is computed directly on the
+    database, without loading the transactions.
+
+    :param s: session from Actual local database.
+    :param account: account (either Account object or Account name) to look for transactions.
+    :return: the date of the latest transaction, or `None` if the account has no transactions.
+    """
+    account = get_account(s, account)
+    if account is None:
+        return None
+    query = select(func.max(Transactions.date)).where(
+        Transactions.acct == account.id,
+        Transactions.is_parent == 0,
+        func.coalesce(Transactions.tombstone, 0) == 0,
+    )
+    latest_date = s.exec(query).one()
+    return int_to_date(latest_date) if latest_date is not None else None
+
+
 def match_transaction(
     s: Session,
     date: datetime.date,
@@ -163,7 +192,7 @@ def match_transaction(
     payee: str | Payees = "",
     amount: decimal.Decimal | float | int = 0,
     imported_id: str | None = None,
-    already_matched: typing.List[Transactions] = None,
+    already_matched: typing.List[Transactions] | typing.Dict[str, Transactions] = None,
 ) -> typing.Optional[Transactions]:
     """Matches a transaction with another transaction based on the fuzzy matching described at
     [`reconcileTransactions`](
@@ -175,6 +204,8 @@ def match_transaction(
     - The transaction with the same exact amount and around the same date (7 days), with the same payee (closest first)
     - The transaction with the same exact amount and around the same date (7 days, closest first)
 
+    The `already_matched` transactions are never returned as a fuzzy match. They can be provided as a list, or as a
+    dictionary from the transaction id to the transaction, that avoids rebuilding the lookup on every call.
     """
     # First, match with an existing transaction's imported_id
     if imported_id:
@@ -189,7 +220,7 @@ def match_transaction(
     results: typing.List[Transactions] = s.exec(query).all()  # noqa
     # filter out the ones that were already matched
     if already_matched:
-        matched = {t.id for t in already_matched}
+        matched = already_matched if isinstance(already_matched, dict) else {t.id for t in already_matched}
         results = [r for r in results if r.id not in matched]
     if not results:
         # nothing to be matched
@@ -376,7 +407,7 @@ def reconcile_transaction(
     cleared: bool = False,
     imported_payee: str = None,
     update_existing: bool = True,
-    already_matched: typing.List[Transactions] = None,
+    already_matched: typing.List[Transactions] | typing.Dict[str, Transactions] = None,
 ) -> Transactions:
     """Matches the transaction to an existing transaction using fuzzy matching.
 
@@ -397,7 +428,9 @@ def reconcile_transaction(
     importing data and before running rules.
     :param update_existing: if the transaction should be updated to the provided properties, if a match is found.
     :param already_matched: list of the transactions that were already matched. When importing a list of transactions,
-    this would prevent transactions with the exact same (date, amount) to be assigned as duplicates.
+    this would prevent transactions with the exact same (date, amount) to be assigned as duplicates. For large imports,
+    a dictionary from the transaction id to the transaction can be provided instead, so that the lookup is not rebuilt
+    for every transaction.
     :return: the generated or matched transaction object.
     """
     account = get_account(s, account)
@@ -570,6 +603,19 @@ def get_accounts(s: Session, name: str = None, include_deleted: bool = False) ->
     return s.exec(query).unique().all()
 
 
+def get_syncable_accounts(s: Session) -> typing.Sequence[Accounts]:
+    """
+    Returns a list of the accounts that are linked to a bank sync provider, meaning that both the `account_id` and the
+    `account_sync_source` are set. Deleted accounts are excluded. Unlike `get_accounts`, the transactions are not
+    loaded, as the filtering is done by the database.
+
+    :param s: session from Actual local database.
+    :return: list of accounts linked to a bank sync provider.
+    """
+    query = base_query(Accounts).filter(Accounts.account_id.isnot(None), Accounts.account_sync_source.isnot(None))
+    return s.exec(query).all()
+
+
 def get_payees(s: Session, name: str = None, include_deleted: bool = False) -> typing.Sequence[Payees]:
     """
     Returns a list of all available payees.
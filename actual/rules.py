@@ -326,11 +326,20 @@ class Condition(pydantic.BaseModel):
             raise ValueError(f"Value {self.value} is not valid for type {self.type.name} and operation {self.op.name}")
         return self
 
-    def run(self, transaction: Transactions) -> bool:
+    def evaluator(self) -> typing.Callable[[Transactions], bool]:
+        """Returns a function that evaluates the condition for a transaction. The condition value and the transaction
+        attribute are resolved only once, so the same function can be applied to many transactions."""
         attr = get_attribute_by_table_name(Transactions.__tablename__, self.field)
-        true_value = get_value(getattr(transaction, attr), self.type)
-        self_value = self.get_value()
-        return condition_evaluation(self.op, true_value, self_value, self.options)
+        op, value_type, self_value, options = self.op, self.type, self.get_value(), self.options
+
+        def evaluate(transaction: Transactions) -> bool:
+            true_value = get_value(getattr(transaction, attr), value_type)
+            return condition_evaluation(op, true_value, self_value, options)
+
+        return evaluate
+
+    def run(self, transaction: Transactions) -> bool:
+        return self.evaluator()(transaction)
 
 
 class Action(pydantic.BaseModel):
@@ -550,19 +559,34 @@ class Rule(pydantic.BaseModel):
         op = any if self.operation == "or" else all
         return op(c.run(transaction) for c in self.conditions)
 
+    def _apply(self, transaction: Transactions) -> None:
+        splits = self.set_split_amount(transaction)
+        if splits:
+            transaction.splits = splits
+        for action in self.actions:
+            if action.op == ActionType.SET_SPLIT_AMOUNT:
+                continue  # handle in the create_splits
+            action.run(transaction)
+
     def run(self, transaction: Transactions) -> bool:
         """Runs the rule on the transaction, calling evaluate, and if the return is `True` then running each of
         the actions."""
         if condition_met := self.evaluate(transaction):
-            splits = self.set_split_amount(transaction)
-            if splits:
-                transaction.splits = splits
-            for action in self.actions:
-                if action.op == ActionType.SET_SPLIT_AMOUNT:
-                    continue  # handle in the create_splits
-                action.run(transaction)
+            self._apply(transaction)
         return condition_met
 
+    def run_many(self, transactions: typing.Iterable[Transactions]) -> typing.List[Transactions]:
+        """Runs the rule on each of the transactions, the same way as `run`, returning the transactions for which the
+        conditions were met. The conditions are prepared once for the whole batch, instead of once per transaction."""
+        op = any if self.operation == "or" else all
+        evaluators = [c.evaluator() for c in self.conditions]
+        matched = []
+        for transaction in transactions:
+            if op(evaluate(transaction) for evaluate in evaluators):
+                self._apply(transaction)
+                matched.append(transaction)
+        return matched
+
 
 class RuleSet(pydantic.BaseModel):
     """
@@ -608,8 +632,7 @@ class RuleSet(pydantic.BaseModel):
     ):
         for rule in [r for r in self.rules if r.stage == stage]:
             if isinstance(transaction, list):
-                for t in transaction:
-                    rule.run(t)
+                rule.run_many(transaction)
             else:
                 rule.run(transaction)
 
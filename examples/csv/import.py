@@ -28,7 +28,7 @@ def main():
             actual.create_budget("CSV Import")
             actual.upload_budget()
         # now try to do all the changes
-        added_transactions = []
+        added_transactions = {}
         for row in load_csv_data(file):
             # here, we define the basic information from the file
             account_name, payee, notes, category, cleared, date, amount = (
@@ -57,7 +57,7 @@ def main():
                 cleared=cleared,
                 already_matched=added_transactions,
             )
-            added_transactions.append(t)
+            added_transactions[t.id] = t
             if t.changed():
                 print(f"Added or modified {t}")
         # finally, the commit will push the changes to the server
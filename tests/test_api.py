@@ -1,14 +1,30 @@
+import datetime
+import io
+import json
+import sqlite3
+import tempfile
 import zipfile
 from unittest.mock import patch
 
 import pytest
 from requests import Session
+from sqlmodel import create_engine
 
 from actual import Actual, reflect_model
 from actual.api import ListUserFilesDTO
 from actual.api.models import RemoteFileListDTO, StatusCode
 from actual.exceptions import ActualError, AuthorizationError, UnknownFileId
-from actual.protobuf_models import Message
+from actual.protobuf_models import HULC_Client, Message, SyncRequest, SyncResponse
+from actual.queries import (
+    create_account,
+    create_rule,
+    create_transaction,
+    get_account,
+    get_accounts,
+    get_or_create_clock,
+    get_payees,
+)
+from actual.rules import Action, Condition, Rule
 from tests.conftest import RequestsMock
 
 
@@ -99,3 +115,213 @@ def test_api_extra_headers(mocker):
     actual = Actual(token="foo", extra_headers={"foo": "bar"})
     assert actual._requests_session.headers["foo"] == "bar"
     assert actual._requests_session.headers["X-ACTUAL-TOKEN"] == "foo"
+
+
+def test_run_migrations(mocker, tmp_path):
+    mocker.patch("actual.Actual.validate")
+    migrations = {
+        "migrations/1000_first.sql": b"BEGIN TRANSACTION;\nCREATE TABLE foo (id TEXT PRIMARY KEY);\nCOMMIT;\n",
+        "migrations/2000_second.js": b"await db.execQuery(`INSERT INTO foo (id) VALUES ('bar');`);",
+    }
+    data_file = mocker.patch("actual.Actual.data_file", side_effect=lambda f: migrations[f])
+    with sqlite3.connect(tmp_path / "db.sqlite") as conn:
+        conn.execute("CREATE TABLE __migrations__ (id INT PRIMARY KEY NOT NULL);")
+    actual = Actual(token="foo", data_dir=tmp_path)
+    actual.engine = create_engine(f"sqlite:///{tmp_path}/db.sqlite")
+    actual.run_migrations(["db.sqlite", *migrations.keys()])
+    assert data_file.call_count == 2
+    # the model is reflected on demand, and kept while the schema does not change
+    meta = actual._reflected_meta()
+    assert "foo" in meta.tables
+    actual.run_migrations(list(migrations.keys()))
+    assert data_file.call_count == 2  # migrations are not executed twice
+    assert actual._reflected_meta() is meta
+    with sqlite3.connect(tmp_path / "db.sqlite") as conn:
+        assert conn.execute("SELECT id FROM __migrations__ ORDER BY id").fetchall() == [(1000,), (2000,)]
+        assert conn.execute("SELECT id FROM foo").fetchall() == [("bar",)]
+    # a failing migration should not leave the database in a partial state
+    data_file.side_effect = [b"CREATE TABLE baz (id TEXT);", b"INSERT INTO missing VALUES (1);"]
+    with pytest.raises(sqlite3.OperationalError):
+        actual.run_migrations(["migrations/3000_third.sql", "migrations/4000_fourth.sql"])
+    with sqlite3.connect(tmp_path / "db.sqlite") as conn:
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'baz'").fetchall() == []
+        assert conn.execute("SELECT MAX(id) FROM __migrations__").fetchone() == (2000,)
+    # when the transaction was already rolled back by SQLite, the original error is raised
+    data_file.side_effect = [b"ROLLBACK; INSERT INTO missing VALUES (1);"]
+    with pytest.raises(sqlite3.OperationalError, match="no such table: missing"):
+        actual.run_migrations(["migrations/5000_fifth.sql"])
+
+
+def test_api_apply_multiple_changes(mocker, session):
+    mocker.patch("actual.Actual.validate")
+    actual = Actual(token="foo")
+    actual.engine = session.bind
+    actual._meta = reflect_model(session.bind)
+    changes = [
+        ("accounts", "one", "name", "Bank"),
+        ("accounts", "two", "name", "Savings"),
+        ("accounts", "one", "offbudget", 1),
+        ("payees", "one", "name", "Payee"),
+        ("accounts", "one", "name", "Checking"),  # later values should override the previous ones
+    ]
+    messages = []
+    for dataset, row, column, value in changes:
+        m = Message(dict(dataset=dataset, row=row, column=column))
+        m.set_value(value)
+        messages.append(m)
+    actual.apply_changes(messages)
+    accounts = {a.id: a for a in get_accounts(session)}
+    assert accounts["one"].name == "Checking"
+    assert accounts["one"].offbudget == 1
+    assert accounts["two"].name == "Savings"
+    assert get_payees(session)[0].name == "Payee"
+    # existing rows are updated
+    m = Message(dict(dataset="accounts", row="two", column="name"))
+    m.set_value("Investments")
+    actual.apply_changes([m])
+    session.expire_all()
+    assert get_account(session, "Investments").id == "two"
+
+
+def test_export_data(mocker, tmp_path):
+    mocker.patch("actual.Actual.validate")
+    (tmp_path / "db.sqlite").write_bytes(b"database")
+    (tmp_path / "metadata.json").write_text('{"id": "foo"}')
+    actual = Actual(token="foo", data_dir=tmp_path)
+    # zip file is returned when no output is provided
+    content = actual.export_data(cleanup=False)
+    with zipfile.ZipFile(io.BytesIO(content)) as z:
+        assert z.read("db.sqlite") == b"database"
+        assert z.read("metadata.json") == b'{"id": "foo"}'
+    # otherwise, it's written directly to the output file
+    assert actual.export_data(tmp_path / "export.zip", cleanup=False) is None
+    with zipfile.ZipFile(tmp_path / "export.zip") as z:
+        assert z.namelist() == ["db.sqlite", "metadata.json"]
+        assert z.getinfo("db.sqlite").compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_import_zip(mocker, tmp_path):
+    mocker.patch("actual.Actual.validate")
+    mocker.patch("actual.Actual.create_engine")
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("db.sqlite", b"database")
+        z.writestr("metadata.json", '{"cloudFileId": "foo"}')
+        z.writestr("../outside.txt", b"should not be extracted")
+    actual = Actual(token="foo", data_dir=tmp_path / "data")
+    (tmp_path / "data").mkdir()
+    actual.import_zip(archive)
+    assert (tmp_path / "data" / "db.sqlite").read_bytes() == b"database"
+    assert actual.get_metadata() == {"cloudFileId": "foo"}
+    assert not (tmp_path / "outside.txt").exists()
+
+
+def test_download_budget_import_zip(mocker, tmp_path):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("db.sqlite", b"database")
+        z.writestr("metadata.json", '{"cloudFileId": "foo"}')
+    for method in ("validate", "create_engine", "download_master_encryption_key", "run_migrations", "sync"):
+        mocker.patch(f"actual.Actual.{method}")
+    mocker.patch("actual.Actual.download_user_file", return_value=archive.getvalue())
+    mocker.patch("actual.Actual.data_file_index", return_value=["db.sqlite"])
+    import_zip = mocker.spy(Actual, "import_zip")
+    actual = Actual(token="foo", data_dir=tmp_path)
+    actual._file = RemoteFileListDTO(name="foo", fileId="foo", groupId="bar", deleted=0, encryptKeyId=None)
+    actual.download_budget()
+    # zipfile needs a seekable file to read the members, which SpooledTemporaryFile only is from Python 3.11
+    zip_file = import_zip.call_args.args[1]
+    assert not isinstance(zip_file, tempfile.SpooledTemporaryFile)
+    assert (tmp_path / "db.sqlite").read_bytes() == b"database"
+    assert actual.get_metadata() == {"cloudFileId": "foo", "groupId": "bar"}
+
+
+@pytest.mark.parametrize("auto_vacuum", ["NONE", "INCREMENTAL"])
+def test_compact(mocker, tmp_path, auto_vacuum):
+    mocker.patch("actual.Actual.validate")
+    conn = sqlite3.connect(tmp_path / "db.sqlite", isolation_level=None)
+    conn.executescript(
+        f"""
+        PRAGMA auto_vacuum={auto_vacuum};
+        CREATE TABLE foo (id TEXT);
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100)
+        INSERT INTO foo (id) SELECT hex(randomblob(2048)) FROM n;
+        DELETE FROM foo;
+        """
+    )
+    assert conn.execute("PRAGMA freelist_count;").fetchone()[0] > 0
+    actual = Actual(token="foo", data_dir=tmp_path)
+    actual.compact()
+    assert conn.execute("PRAGMA freelist_count;").fetchone()[0] == 0
+    conn.close()
+
+
+def test_metadata_flush(mocker, tmp_path):
+    mocker.patch("actual.Actual.validate")
+    actual = Actual(token="foo", data_dir=tmp_path)
+    actual.update_metadata({"id": "foo"})
+    actual.update_metadata({"budgetName": "Budget"})
+    # nothing is written until the metadata is flushed
+    assert not (tmp_path / "metadata.json").is_file()
+    assert actual.get_metadata() == {"id": "foo", "budgetName": "Budget"}
+    # changing the returned dictionary does not change the metadata
+    actual.get_metadata()["id"] = "bar"
+    assert actual.get_metadata()["id"] == "foo"
+    actual.__exit__(None, None, None)
+    assert json.loads((tmp_path / "metadata.json").read_text()) == {"id": "foo", "budgetName": "Budget"}
+    # the exported zip contains the latest changes
+    (tmp_path / "db.sqlite").write_bytes(b"database")
+    actual.update_metadata({"groupId": "bar"})
+    with zipfile.ZipFile(io.BytesIO(actual.export_data(cleanup=False))) as z:
+        assert json.loads(z.read("metadata.json"))["groupId"] == "bar"
+
+
+def test_apply_changes_prefs(mocker, session, tmp_path):
+    mocker.patch("actual.Actual.validate")
+    (tmp_path / "metadata.json").write_text('{"id": "foo"}')
+    actual = Actual(token="foo", data_dir=tmp_path)
+    actual.engine = session.bind
+    m = Message(dict(dataset="prefs", row="budgetName", column="value"))
+    m.set_value("Budget")
+    actual.apply_changes([m])
+    # preferences are written to the metadata.json right away
+    assert json.loads((tmp_path / "metadata.json").read_text()) == {"id": "foo", "budgetName": "Budget"}
+
+
+def test_sync_stores_clock(mocker, session):
+    mocker.patch("actual.Actual.validate")
+    m = Message(dict(dataset="accounts", row="one", column="name"))
+    m.set_value("Bank")
+    req = SyncRequest()
+    req.set_messages([m], HULC_Client("foo"))
+    mocker.patch("actual.Actual.sync_sync", return_value=SyncResponse({"merkle": "", "messages": req.messages}))
+    actual = Actual(token="foo")
+    actual._file = RemoteFileListDTO(name="foo", fileId="foo", groupId="foo", deleted=0, encryptKeyId=None)
+    actual._client = HULC_Client("bar")
+    actual.engine = session.bind
+    actual._meta = reflect_model(session.bind)
+    actual.sync()
+    assert get_account(session, "Bank").id == "one"
+    # the clock is stored together with the changes
+    assert get_or_create_clock(session).get_timestamp().client_id == "foo"
+
+
+def test_run_rules_with_rule_changes(mocker, session):
+    mocker.patch("actual.Actual.validate")
+    actual = Actual(token="foo")
+    actual._session = session
+    create_account(session, "Bank")
+    t = create_transaction(session, datetime.date(2024, 1, 1), "Bank", notes="Rent")
+    actual.run_rules([t])
+    assert t.cleared == 0
+    # a rule created in the session is considered on the next run
+    rule = Rule(
+        conditions=[Condition(field="notes", op="is", value="Rent")], actions=[Action(field="cleared", value=True)]
+    )
+    create_rule(session, rule)
+    actual.run_rules([t])
+    assert t.cleared == 1
+    # a provided ruleset is used instead
+    ruleset = mocker.MagicMock()
+    actual.run_rules([t], ruleset)
+    ruleset.run.assert_called_once_with([t])
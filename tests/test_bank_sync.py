@@ -8,7 +8,7 @@ from requests import Session
 from actual import Actual, ActualBankSyncError
 from actual.api.bank_sync import TransactionItem
 from actual.database import Banks
-from actual.queries import create_account
+from actual.queries import create_account, create_transaction
 from tests.conftest import RequestsMock
 
 response = {
@@ -211,3 +211,54 @@ def test_bank_sync_exception(session, mocker):
         # now try to run the bank sync
         with pytest.raises(ActualBankSyncError):
             actual.run_bank_sync()
+
+
+def test_bank_sync_multiple_accounts(session, mocker):
+    mocker.patch.object(Session, "get").return_value = RequestsMock({"status": "ok", "data": {"validated": True}})
+    responses = {"first": copy.deepcopy(response), "second": copy.deepcopy(response)}
+    responses["second"]["transactions"]["all"] = responses["second"]["transactions"]["all"][:1]
+
+    def post(url, json):
+        if url.endswith("/status"):
+            return RequestsMock({"status": "ok", "data": {"configured": True}})
+        return RequestsMock({"status": "ok", "data": responses[json["accountId"]]})
+
+    post_mock = mocker.patch.object(Session, "post")
+    post_mock.side_effect = post
+    with Actual(token="foo") as actual:
+        actual._session = session
+        for name in ("first", "second"):
+            acct = create_account(session, name)
+            acct.account_sync_source, acct.account_id = "simpleFin", name
+        session.commit()
+        batches = list(actual.run_bank_sync_iter())
+        # results keep the account order, the second account also gets a starting balance since the sums differ
+        assert [[t.account.name for t in batch] for batch in batches] == [["first", "first"], ["second", "second"]]
+        # the status is only checked once, since both accounts use the same sync method
+        assert sum(call.args[0].endswith("/status") for call in post_mock.call_args_list) == 1
+
+
+def test_bank_sync_start_date_per_account(session, mocker):
+    mocker.patch.object(Session, "get").return_value = RequestsMock({"status": "ok", "data": {"validated": True}})
+    start_dates = {}
+
+    def post(url, json):
+        if url.endswith("/status"):
+            return RequestsMock({"status": "ok", "data": {"configured": True}})
+        start_dates[json["accountId"]] = json["startDate"]
+        return RequestsMock({"status": "ok", "data": copy.deepcopy(response)})
+
+    mocker.patch.object(Session, "post").side_effect = post
+    with Actual(token="foo") as actual:
+        actual._session = session
+        for name in ("first", "second"):
+            acct = create_account(session, name)
+            acct.account_sync_source, acct.account_id = "simpleFin", name
+        create_transaction(session, datetime.date(2024, 6, 1), "second", amount=-10)
+        session.commit()
+        sync_account = mocker.spy(Actual, "_run_bank_sync_account")
+        actual.run_bank_sync()
+        # the first account has no transactions, so the first sync flag should not leak to the second account
+        ninety_days_ago = datetime.date.today() - datetime.timedelta(days=90)
+        assert start_dates == {"first": ninety_days_ago.strftime("%Y-%m-%d"), "second": "2024-06-01"}
+        assert [call.args[3] for call in sync_account.call_args_list] == [True, False]
@@ -8,6 +8,7 @@ from actual.crypto import (
     decrypt,
     decrypt_from_meta,
     encrypt,
+    encrypt_bytes,
     make_salt,
     make_test_message,
     random_bytes,
@@ -36,6 +37,16 @@ def test_encrypt_decrypt():
         decrypt_from_meta(key[::-1], base64.b64decode(encrypted["value"]), EncryptMetaDTO(**encrypted["meta"]))
 
 
+def test_encrypt_bytes():
+    key = create_key_buffer("foo", "bar")
+    ciphertext, meta = encrypt_bytes("foo", key, b"foobar")
+    assert isinstance(ciphertext, bytes)
+    assert decrypt_from_meta(key, ciphertext, EncryptMetaDTO(**meta)) == b"foobar"
+    # the ciphertext with the appended tag is also valid for the one-shot decryption
+    iv, auth_tag = base64.b64decode(meta["iv"]), base64.b64decode(meta["authTag"])
+    assert decrypt(key, iv, ciphertext + auth_tag) == b"foobar"
+
+
 def test_encrypt_decrypt_message():
     key = create_key_buffer("foo", "bar")
     m = Message(dict(dataset=random_bytes(), row=random_bytes(), column=random_bytes(), value=random_bytes()))
@@ -58,3 +69,11 @@ def test_create_test_message():
     )
     m = Message.deserialize(dfm)
     assert isinstance(m, Message)
+
+
+def test_create_key_buffer_is_cached():
+    create_key_buffer.cache_clear()
+    first = create_key_buffer("foo", "bar")
+    assert create_key_buffer("foo", "bar") is first
+    assert create_key_buffer.cache_info().hits == 1
+    assert create_key_buffer("foo", "baz") != first
@@ -4,9 +4,10 @@ import json
 from datetime import date, timedelta
 
 import pytest
+from sqlmodel import create_engine
 
 from actual import Actual, ActualError, reflect_model
-from actual.database import Notes, ReflectBudgets, ZeroBudgets
+from actual.database import Notes, ReflectBudgets, ZeroBudgets, set_sqlite_pragmas
 from actual.queries import (
     create_account,
     create_budget,
@@ -17,12 +18,14 @@ from actual.queries import (
     get_accounts,
     get_accumulated_budgeted_balance,
     get_budgets,
+    get_latest_transaction_date,
     get_or_create_category,
     get_or_create_clock,
     get_or_create_payee,
     get_or_create_preference,
     get_preferences,
     get_ruleset,
+    get_syncable_accounts,
     get_transactions,
     normalize_payee,
     reconcile_transaction,
@@ -135,6 +138,46 @@ def test_reconcile_transaction(session):
     )
 
 
+def test_reconcile_transaction_already_matched(session):
+    today = date.today()
+    create_account(session, "Bank")
+    first = create_transaction(session, today, "Bank", "Shop", amount=-10)
+    session.commit()
+    # a transaction that was already matched should not be matched again, both as a list and as a dictionary
+    for already_matched in ([first], {first.id: first}):
+        duplicate = reconcile_transaction(session, today, "Bank", "Shop", amount=-10, already_matched=already_matched)
+        assert duplicate.id != first.id
+        session.rollback()
+    assert reconcile_transaction(session, today, "Bank", "Shop", amount=-10).id == first.id
+
+
+def test_get_latest_transaction_date(session):
+    today = date.today()
+    bank = create_account(session, "Bank")
+    assert get_latest_transaction_date(session, bank) is None
+    create_transaction(session, today - timedelta(days=2), bank, amount=-10)
+    deleted = create_transaction(session, today, bank, amount=-10)
+    deleted.delete()
+    create_transaction(session, today - timedelta(days=5), bank, amount=-10)
+    session.commit()
+    assert get_latest_transaction_date(session, "Bank") == today - timedelta(days=2)
+    assert get_latest_transaction_date(session, "Bank") == get_transactions(session, account=bank)[0].get_date()
+
+
+def test_get_syncable_accounts(session):
+    for name in ("Bank", "Wallet", "Deleted", "Missing source"):
+        create_account(session, name)
+    bank, _, deleted, missing_source = get_accounts(session)
+    bank.account_id, bank.account_sync_source = "foo", "goCardless"
+    deleted.account_id, deleted.account_sync_source = "bar", "simpleFin"
+    deleted.delete()
+    missing_source.account_id = "baz"
+    session.commit()
+    assert get_syncable_accounts(session) == [bank]
+    assert bank.sync_method_key == "gocardless"
+    assert missing_source.sync_method_key == ""
+
+
 def test_create_splits(session):
     bank = create_account(session, "Bank")
     t = create_transaction(session, date.today(), bank, category="Dining", amount=-10.0)
@@ -390,3 +433,11 @@ def test_set_payee_to_transfer(session):
     session.commit()
     assert t.payee_id == wallet.payee.id
     assert t.transfer.transfer == t
+
+
+def test_set_sqlite_pragmas(tmp_path):
+    eng = set_sqlite_pragmas(create_engine(f"sqlite:///{tmp_path}/db.sqlite"))
+    with eng.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2  # MEMORY
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
@@ -5,7 +5,7 @@ from sqlalchemy import delete, select
 from testcontainers.core.container import DockerContainer
 from testcontainers.core.waiting_utils import wait_for_logs
 
-from actual import Actual, js_migration_statements
+from actual import Actual, js_migration_statements, sql_migration_statements
 from actual.database import __TABLE_COLUMNS_MAP__, Dashboard, Migrations, reflect_model
 from actual.exceptions import ActualDecryptionError, ActualError, AuthorizationError
 from actual.queries import (
@@ -232,3 +232,17 @@ def test_empty_query_migrations():
     assert js_migration_statements("await db.runQuery(") == []
     # weird formats neither
     assert js_migration_statements("db.runQuery\n('update 1')") == ["update 1;"]
+
+
+def test_sql_migration_statements():
+    statements = sql_migration_statements(
+        "BEGIN TRANSACTION;\n"
+        "CREATE TABLE foo (id TEXT PRIMARY KEY);\n"
+        "CREATE TRIGGER bar AFTER INSERT ON foo BEGIN UPDATE foo SET id = 1; END;\n"
+        "-- end of migration\n"
+        "COMMIT;\n"
+    )
+    assert statements == [
+        "CREATE TABLE foo (id TEXT PRIMARY KEY);",
+        "CREATE TRIGGER bar AFTER INSERT ON foo BEGIN UPDATE foo SET id = 1; END;",
+    ]
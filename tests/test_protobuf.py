@@ -41,6 +41,7 @@ def test_message_set_value():
     for data in ["foo", 1, 1.5, None]:
         m.set_value(data)
         assert m.get_value() == data
+        assert Message.decode_value(Message.pb(m).value) == data
     with pytest.raises(ValueError):
         m.set_value(object())  # noqa
     with pytest.raises(ValueError):
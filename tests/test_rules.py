@@ -72,6 +72,29 @@ def test_datetime_rule(session):
     assert Condition(field="date", op="lt", value=target_date + datetime.timedelta(days=1)).run(t) is True
 
 
+def test_run_many(session):
+    acct = create_account(session, "Bank")
+    transactions = [
+        create_transaction(session, datetime.date(2024, 1, 1), acct, "", notes="Rent"),
+        create_transaction(session, datetime.date(2024, 1, 2), acct, "", notes="Groceries"),
+        create_transaction(session, datetime.date(2024, 1, 3), acct, "", notes="Rent"),
+    ]
+    rule = Rule(
+        conditions=[
+            Condition(field="notes", op="is", value="rent"),
+            Condition(field="date", op="gt", value=datetime.date(2024, 1, 1)),
+        ],
+        actions=[Action(field="cleared", value=True)],
+        operation="or",
+    )
+    # same results as running the rule on each transaction
+    assert rule.run_many(transactions) == transactions
+    assert all(t.cleared for t in transactions)
+    rule.operation = "and"
+    assert rule.run_many(transactions) == [transactions[2]]
+    assert [rule.run(t) for t in transactions] == [False, False, True]
+
+
 def test_string_condition(session):
     acct = create_account(session, "Bank")
     t = create_transaction(session, datetime.date(2024, 1, 1), acct, "", "foo")